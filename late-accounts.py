@@ -3,16 +3,26 @@
 # html creation code largely created by chatGPT 4o
 # licensed under the GNU General Public License, version 2
 
-# note that Companies House throttling means this takes about 90 minutes to run.
+# note that Companies House throttling (600 requests every five minutes) means this takes about 40 minutes to run.
 
 # 
 
 import os
-import time
+import asyncio
+import random
 import requests
-import json
-from datetime import datetime
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import aiohttp
+from aiolimiter import AsyncLimiter
+import diskcache
+import orjson
+from datetime import date, datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+from itertools import islice, takewhile
+from python_calamine import CalamineWorkbook
 
 from jinja2 import Environment, FileSystemLoader
 
@@ -58,10 +68,27 @@ listed_sources = {
 # how many results to return. The Companies House limit is 5,000. Fortunately there are only about 4,500 active plcs
 MAX_SEARCH_SIZE = 5000
 
-# for when we are throttled
-API_RETRY_WAIT = 30
+# how many company profile requests to have in flight at once
+MAX_CONCURRENT_REQUESTS = 64
+
+# the Companies House rate limit is 600 requests per five minute window. We pace requests to stay within it
+API_RATE_LIMIT = 600
+API_RATE_PERIOD = 300
+
+# for when we are throttled anyway - exponential back-off, in seconds
+API_BACKOFF_BASE = 1
+API_BACKOFF_CAP = 60
 MAX_API_RETRIES = 50
 
+# company profiles are cached on disk. A profile fetched on an earlier day is re-requested from Companies House, as
+# its "overdue" flags may have changed since - in particular, a deadline may have passed
+PROFILE_CACHE_DIRECTORY = '.ch_cache'
+# stale profiles are kept a while longer so they can be revalidated with their ETag, then dropped
+PROFILE_CACHE_EXPIRY = 7 * 24 * 60 * 60
+
+# the LSE issuer lists rarely change, so we keep the last download and only fetch them again if they have changed
+ISSUER_CACHE_DIRECTORY = 'cache'
+
 PLC_LIST_FILE = 'active_plcs.json'
 
 LATE_ACCOUNTS_LIST_FILE = 'late_plcs.json'
@@ -70,20 +97,33 @@ ACCOUNTS_HTML_EXPORT_FILE = 'late_plc_table.html'
 LATE_CONFIRMATIONS_LIST_FILE = 'late_confirmations_plcs.json'
 CONFIRMATIONS_HTML_EXPORT_FILE = 'late_confirmations_plcs_table.html'
 
+# results are checkpointed as we go, so that an interrupted run picks up where it left off
+LATE_ACCOUNTS_CHECKPOINT_FILE = 'late_plcs.jsonl'
+LATE_CONFIRMATIONS_CHECKPOINT_FILE = 'late_confirmations_plcs.jsonl'
+PROCESSED_PLCS_FILE = 'processed_plcs.txt'
+
 LOGFILE = "late-accounts.log"
 
+# one session for the blocking requests, so connections are kept alive and reused, and
+# throttled/failed requests are retried with back-off
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[429, 502, 503, 504], raise_on_status=False)))
+
+# the run takes a while, but we measure lateness against the day it started
+TODAY = date.today()
+
 def get_active_plcs():
     companies = []
 
     url = f'{COMPANIES_HOUSE_API_URL}{CH_ADVANCED_SEARCH}?company_status=active&company_type=plc&size={MAX_SEARCH_SIZE}'
     
-    response = requests.get(url, auth=(companies_house_secrets.api_key, ''))
+    response = SESSION.get(url, auth=(companies_house_secrets.api_key, ''))
     
     if response.status_code != 200:
         logger.info(f"Error: {response.status_code} - {response.text}")
         return
     
-    data = response.json()
+    data = orjson.loads(response.content)
     companies.extend(data.get('items', []))
     logger.info(f"Downloaded {len(companies)}...")
             
@@ -92,21 +132,66 @@ def get_active_plcs():
 
 
 def save_to_file(companies, filename):
-    with open(filename, 'w') as file:
-        json.dump(companies, file, indent=4)
+    Path(filename).write_bytes(orjson.dumps(companies, option=orjson.OPT_APPEND_NEWLINE))
         
 
 def load_from_file(filename):
     try:
-        with open(filename, 'r') as file:
-            companies = json.load(file)
-            return companies
+        return orjson.loads(Path(filename).read_bytes())
     except FileNotFoundError:
         logger.info(f"Error: The file '{filename}' was not found.")
         return []
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         logger.info(f"Error: The file '{filename}' is not a valid JSON file.")
         return []
+
+
+def append_to_jsonl(item, filename):
+    with open(filename, 'ab') as file:
+        file.write(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE))
+
+
+def load_from_jsonl(filename):
+    items = {}
+    try:
+        with open(filename, 'rb') as file:
+            for line in file:
+                try:
+                    item = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # a line only half-written when the last run was interrupted
+                    logger.info(f"Error: skipping invalid line in '{filename}'")
+                    continue
+                # a company may have been logged but not marked as processed before an interruption, so de-duplicate
+                items[item["link"]] = item
+    except FileNotFoundError:
+        pass
+    return list(items.values())
+
+
+def start_checkpoints():
+    # the first line of the processed list is the date the run started. A checkpoint from an earlier day is out of
+    # date - filings may have been made since, and days_late has moved on - so start again
+    try:
+        run_date = Path(PROCESSED_PLCS_FILE).read_text().split("\n", 1)[0]
+    except FileNotFoundError:
+        run_date = None
+    
+    if run_date != TODAY.isoformat():
+        if run_date is not None:
+            logger.warning(f"Discarding checkpoint from an earlier run ({run_date})")
+        clear_checkpoints()
+        Path(PROCESSED_PLCS_FILE).write_text(f"{TODAY.isoformat()}\n")
+
+
+def load_processed_plcs():
+    # skip the run date on the first line
+    return set(Path(PROCESSED_PLCS_FILE).read_text().split()[1:])
+
+
+def clear_checkpoints():
+    for filename in (LATE_ACCOUNTS_CHECKPOINT_FILE, LATE_CONFIRMATIONS_CHECKPOINT_FILE, PROCESSED_PLCS_FILE):
+        Path(filename).unlink(missing_ok=True)
     
     
 def get_list_of_UK_issuers(data_source):
@@ -116,212 +201,318 @@ def get_list_of_UK_issuers(data_source):
     name_column = data_source["name_column"]
     place_of_incorporation_column = data_source["place_of_incorporation_column"]
     
-    # Load the Excel file from the provided URL
-    df = pd.read_excel(url)
+    # e.g. cache/Issuer list_2.xlsx, with its ETag and Last-Modified date in cache/Issuer list_2.json
+    cache_file = Path(ISSUER_CACHE_DIRECTORY) / Path(unquote(urlsplit(url).path)).name
+    headers_file = cache_file.with_suffix('.json')
     
-    # Initialize an empty list to store company names
-    company_names = []
+    # only download the file if it has changed since we last downloaded it
+    headers = {}
+    if cache_file.exists() and headers_file.exists():
+        cached_headers = load_from_file(headers_file) or {}
+        if cached_headers.get("etag"):
+            headers["If-None-Match"] = cached_headers["etag"]
+        if cached_headers.get("last_modified"):
+            headers["If-Modified-Since"] = cached_headers["last_modified"]
     
-    # Iterate through the rows starting from the specified start_row
-    for index, row in df.iterrows():
-        # Skip rows before the start_row
-        if index < start_row:
-            continue
-
-        # Check if the row is blank, if so, break the loop
-        if pd.isna(row.iloc[name_column]) and pd.isna(row.iloc[place_of_incorporation_column]):
-            break
-        
-        # If the place of incorporation is "United Kingdom", add the company name to the list
-        if row.iloc[place_of_incorporation_column] == "United Kingdom":
-            company_names.append(row.iloc[name_column])
+    try:
+        response = SESSION.get(url, headers=headers)
+        if response.status_code != 304:
+            response.raise_for_status()
+    
+    except requests.RequestException as error:
+        # if the LSE is down, our last copy is better than nothing
+        if not cache_file.exists():
+            raise
+        logger.warning(f"Error: couldn't download {cache_file.name} ({error}) - using cached copy")
+    
+    else:
+        if response.status_code == 304:
+            # we still parse our copy, so that changes to our settings or to the parsing below take effect
+            logger.info(f"{cache_file.name} unchanged - using cached copy")
+        else:
+            cache_file.parent.mkdir(exist_ok=True)
+            cache_file.write_bytes(response.content)
+            save_to_file({"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}, headers_file)
+    
+    # Parse the Excel file with calamine
+    workbook = CalamineWorkbook.from_path(str(cache_file))
+    sheet = workbook.get_sheet_by_index(0)
+    
+    # Stream the rows rather than converting the whole sheet to python lists up front.
+    # start_row and the columns are counted from cell A1, with the first row being the header. iter_rows starts at
+    # the first row of the sheet, but at the first column with anything in it, so put back any empty columns on the left
+    first_column = sheet.start[1] if sheet.start else 0
+    rows = ([""] * first_column + row for row in sheet.iter_rows())
+    
+    # Skip the header and the rows before start_row, and only keep the two columns we need
+    rows = ((row[name_column], row[place_of_incorporation_column]) for row in islice(rows, start_row + 1, None))
+    
+    # The list ends at the first blank row
+    rows = takewhile(lambda row: row != ("", ""), rows)
+    
+    # Keep the names of the companies incorporated in the United Kingdom
+    company_names = [name for name, place_of_incorporation in rows if place_of_incorporation == "United Kingdom"]
     
     # Return the list of company names
     return company_names
         
 
-def get_company_profile(company_number):
+async def fetch_profile(session, limiter, cache, company_number):
     url = f'{COMPANIES_HOUSE_API_URL}{CH_GET_PROFILE}{company_number}'
     
+    cached = cache.get(company_number)
+    if cached is not None and cached.get("fetched_on") == TODAY.isoformat():
+        return cached["profile"]
+    
+    # if we have a stale copy, ask Companies House to only send the profile if it has changed
+    headers = {}
+    if cached is not None and cached["etag"]:
+        headers["If-None-Match"] = cached["etag"]
+    
     retries = 0
     while retries < MAX_API_RETRIES:
-        response = requests.get(url, auth=(companies_house_secrets.api_key, ''))
+        try:
+            async with limiter, session.get(url, headers=headers) as response:
         
-        if response.status_code == 200:
-            if "accounts" in response.text:
-                return response.json()
-            else:
-                logger.info(f"Error: Unexpected response format for {company_number} - {response.status_code} - {response.text}")
-                exit(1)
+                if response.status == 304:
+                    cached["fetched_on"] = TODAY.isoformat()
+                    cache.set(company_number, cached, expire=PROFILE_CACHE_EXPIRY)
+                    return cached["profile"]
+            
+                elif response.status == 200:
+                    try:
+                        profile = orjson.loads(await response.read())
+                    except orjson.JSONDecodeError:
+                        logger.warning(f"Error: Response for {company_number} is not valid JSON. Skipping")
+                        return None
+                
+                    if "accounts" in profile:
+                        cache.set(company_number, {"profile": profile, "etag": response.headers.get("ETag"), "fetched_on": TODAY.isoformat()}, expire=PROFILE_CACHE_EXPIRY)
+                        return profile
+                    else:
+                        logger.warning(f"Error: Unexpected response format for {company_number} - {response.status} - {profile}. Skipping")
+                        return None
+            
+                elif response.status == 502 or response.status == 429:
+                    wait = min(API_BACKOFF_CAP, API_BACKOFF_BASE * 2 ** retries) + random.random()
+                    retries += 1
+                    logger.info(f"{response.status} Error: throttled, retrying in {wait:.0f} seconds... ({retries}/{MAX_API_RETRIES})")
+            
+                else:
+                    logger.warning(f"Error: {response.status} for {company_number} - {await response.text(errors='replace')}. Skipping")
+                    return None
         
-        elif response.status_code == 502 or response.status_code == 429:
+        # a dropped connection or a timeout is treated like throttling, and retried after a back-off
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            wait = min(API_BACKOFF_CAP, API_BACKOFF_BASE * 2 ** retries) + random.random()
             retries += 1
-            logger.info(f"{response.status_code} Error: throttled, retrying in 60 seconds... ({retries}/{MAX_API_RETRIES})")
-            time.sleep(API_RETRY_WAIT)
-            
-        else:
-            logger.info(f"Error: {response.status_code} - {response.text}")
-            exit(1)
+            logger.info(f"Error: {error!r} for {company_number}, retrying in {wait:.0f} seconds... ({retries}/{MAX_API_RETRIES})")
+        
+        # sleeping here only parks this coroutine - the other requests carry on
+        await asyncio.sleep(wait)
     
-    logger.info(f"Failed to retrieve company profile for {company_number} after {MAX_API_RETRIES} attempts.")
-    exit(1)
+    logger.warning(f"Failed to retrieve company profile for {company_number} after {MAX_API_RETRIES} attempts. Skipping")
+    return None
+
+
+async def fetch_plc_profile(session, semaphore, limiter, cache, plc):
+    # the semaphore caps how many requests are in flight at any one time
+    async with semaphore:
+        profile = await fetch_profile(session, limiter, cache, plc["company_number"])
+    return plc, profile
 
 def find_days_late(due_date: str) -> int:
-    # Convert the due date string into a datetime object
-    due_date = datetime.strptime(due_date, '%Y-%m-%d').date()
+    # Companies House dates are ISO format (YYYY-MM-DD), so fromisoformat is all we need
+    return (TODAY - date.fromisoformat(due_date)).days
+
+def make_late_filing(plc, due_date: str) -> dict:
+    # the same record is used for late accounts and late confirmation statements
+    data = {}
+    data["name"] = plc["company_name"]
+    data["link"] = f'https://find-and-update.company-information.service.gov.uk/company/{plc["company_number"]}'
+    data["due_date"] = due_date
+    data["days_late"] = find_days_late(due_date)
+    return data
+
+async def get_late_plcs_async(list_of_active_plcs):
     
-    # Get today's date
-    today = datetime.today().date()
+    # pick up any results from an interrupted run today, and don't check those companies again
+    start_checkpoints()
+    late_accounts_list = load_from_jsonl(LATE_ACCOUNTS_CHECKPOINT_FILE)
+    late_confirmations_list = load_from_jsonl(LATE_CONFIRMATIONS_CHECKPOINT_FILE)
+    processed = load_processed_plcs()
     
-    # Calculate the difference in days
-    days_late = (today - due_date).days
+    plcs_to_check = [plc for plc in list_of_active_plcs if plc["company_number"] not in processed]
+    if processed:
+        logger.info(f"Resuming: {len(list_of_active_plcs) - len(plcs_to_check)} PLCs already checked")
     
-    return days_late
-
-def get_late_plcs(list_of_active_plcs):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    # one request every half second. A bucket of 600 would let the first 600 through at once, on top of the steady rate
+    limiter = AsyncLimiter(max_rate=1, time_period=API_RATE_PERIOD / API_RATE_LIMIT)
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENT_REQUESTS)
+    auth = aiohttp.BasicAuth(companies_house_secrets.api_key, '')
     
-    late_accounts_list = []
-    late_confirmations_list = []
-    for i, plc in enumerate(list_of_active_plcs):
+    async with aiohttp.ClientSession(auth=auth, connector=connector) as session:
+        with diskcache.Cache(PROFILE_CACHE_DIRECTORY) as cache:
         
-        logger.info(f'{i + 1}/{len(list_of_active_plcs)}: {plc["company_name"]} - {plc["company_number"]}')
-        profile = get_company_profile(plc["company_number"])
+            tasks = [asyncio.create_task(fetch_plc_profile(session, semaphore, limiter, cache, plc)) for plc in plcs_to_check]
         
-        # first check accounts
-        if "next_accounts" in profile["accounts"]:
+            # profiles are processed in whatever order they come back
+            for i, task in enumerate(asyncio.as_completed(tasks)):
+            
+                plc, profile = await task
+                logger.info(f'{i + 1}/{len(plcs_to_check)}: {plc["company_name"]} - {plc["company_number"]}')
+            
+                # we couldn't get a usable profile - skip it rather than abandon the whole run.
+                # It isn't marked as processed, so it will be tried again if the run is resumed
+                if profile is None:
+                    continue
+            
+                # first check accounts
+                if "next_accounts" in profile["accounts"]:
                 
-            accounting = profile["accounts"]["next_accounts"]
-            if accounting["overdue"]:
+                    accounting = profile["accounts"]["next_accounts"]
+                    if accounting["overdue"]:
                 
-                data = {}
-                data["name"] = plc["company_name"]
-                data["link"] = f'https://find-and-update.company-information.service.gov.uk/company/{plc["company_number"]}'
-                data["due_date"] = accounting["due_on"]
-                data["days_late"] = find_days_late(accounting["due_on"])
+                        data = make_late_filing(plc, accounting["due_on"])
                 
-                late_accounts_list.append(data)
-                logger.info(f"Late accounts: {data}")
-            else:
-                pass
-                # logger.info("Accounts filed on time!")
+                        late_accounts_list.append(data)
+                        append_to_jsonl(data, LATE_ACCOUNTS_CHECKPOINT_FILE)
+                        logger.info(f"Late accounts: {data}")
+                    else:
+                        pass
+                        # logger.info("Accounts filed on time!")
         
-        else:
-            logger.info(f"Inactive company - no accounts")
+                else:
+                    logger.info(f"Inactive company - no accounts")
             
-        # now check confirmation statement
+                # now check confirmation statement
         
-        if "confirmation_statement" in profile:
+                if "confirmation_statement" in profile:
                 
-            confirmation = profile['confirmation_statement']
-            if confirmation["overdue"]:
+                    confirmation = profile['confirmation_statement']
+                    if confirmation["overdue"]:
                 
-                data = {}
-                data["name"] = plc["company_name"]
-                data["link"] = f'https://find-and-update.company-information.service.gov.uk/company/{plc["company_number"]}'
-                data["due_date"] = confirmation["next_due"]
-                data["days_late"] = find_days_late(confirmation["next_due"])
+                        data = make_late_filing(plc, confirmation["next_due"])
                 
-                late_confirmations_list.append(data)
-                logger.info(f"Late confirmation: {data}")
-            else:
-                pass
-                # logger.info("Confirmation filed on time!")
+                        late_confirmations_list.append(data)
+                        append_to_jsonl(data, LATE_CONFIRMATIONS_CHECKPOINT_FILE)
+                        logger.info(f"Late confirmation: {data}")
+                    else:
+                        pass
+                        # logger.info("Confirmation filed on time!")
         
-        else:
-            logger.info(f"Inactive company - no confirmation statement")
+                else:
+                    logger.info(f"Inactive company - no confirmation statement")
+            
+                with open(PROCESSED_PLCS_FILE, 'a') as file:
+                    file.write(f'{plc["company_number"]}\n')
 
         
     return late_accounts_list, late_confirmations_list
 
-def create_html(late_plcs, issuers, html_export_file, number_of_active_plcs):
 
-    # Set up Jinja2 environment and load template
-    env = Environment(loader=FileSystemLoader(searchpath='.'))
-    
-    # Define the template string with Bootstrap and DataTables
-    template_string = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <link rel="stylesheet" href="https://cdn.datatables.net/1.13.4/css/jquery.dataTables.min.css">
-        <link rel="stylesheet" href="https://cdn.datatables.net/1.13.4/css/dataTables.bootstrap5.min.css">
-        <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/5.3.0/css/bootstrap.min.css">
-        <title>Late Filings</title>
-        <style>
-            .container {
-                margin-top: 20px;
-            }
-            table.dataTable thead {
-                background-color: #007bff;
-                color: white;
-            }
-            .highlighted {
-                background-color: yellow !important;
-            }
-        </style>
-    </head>
-    <body>
-        
-        <div class="container">
-            <p>Total late PLCs: {{ number_of_late_plcs }} (out of {{ number_of_active_plcs }} total PLCs). Data last updated: {{ current_date }}.</p>
-            <table id="latePlcsTable" class="table table-striped table-bordered">
-                <thead>
-                    <tr>
-                        <th>Name</th>
-                        <th>Due Date</th>
-                        <th>Days Late</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {% for company in companies %}
-                    <tr {% if company.name in issuers %}class="highlighted"{% endif %}>
-                        <td><a href="{{ company.link }}" target="_blank">{{ company.name }}</a></td>
-                        <td>{{ company.due_date }}</td>
-                        <td>{{ company.days_late }}</td>
-                    </tr>
-                    {% endfor %}
-                </tbody>
-            </table>
-        </div>
-
-        <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-        <script src="https://cdn.datatables.net/1.13.4/js/jquery.dataTables.min.js"></script>
-        <script src="https://cdn.datatables.net/1.13.4/js/dataTables.bootstrap5.min.js"></script>
-        <script>
-            $(document).ready(function() {
-                $('#latePlcsTable').DataTable({
-                    "order": [[ 2, "asc" ]],
-                    "paging": false,
-                    "searching": false,
-                    "autoWidth": true,        
-                    "columnDefs": [
-                        { 
-                            "targets": 0,  // Target the first column
-                            "width": "1%", // Let it auto-size but prevent it from taking too much space
-                            "render": function (data, type, full, meta) {
-                                return '<div style="white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">' + data + '</div>';
-                            }
+def get_late_plcs(list_of_active_plcs):
+    return asyncio.run(get_late_plcs_async(list_of_active_plcs))
+
+# Define the template string with Bootstrap and DataTables
+TEMPLATE_STRING = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <link rel="stylesheet" href="https://cdn.datatables.net/1.13.4/css/jquery.dataTables.min.css">
+    <link rel="stylesheet" href="https://cdn.datatables.net/1.13.4/css/dataTables.bootstrap5.min.css">
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/5.3.0/css/bootstrap.min.css">
+    <title>Late Filings</title>
+    <style>
+        .container {
+            margin-top: 20px;
+        }
+        table.dataTable thead {
+            background-color: #007bff;
+            color: white;
+        }
+        .highlighted {
+            background-color: yellow !important;
+        }
+    </style>
+</head>
+<body>
+    
+    <div class="container">
+        <p>Total late PLCs: {{ number_of_late_plcs }} (out of {{ number_of_active_plcs }} total PLCs). Data last updated: {{ current_date }}.</p>
+        <table id="latePlcsTable" class="table table-striped table-bordered">
+            <thead>
+                <tr>
+                    <th>Name</th>
+                    <th>Due Date</th>
+                    <th>Days Late</th>
+                </tr>
+            </thead>
+            <tbody>
+                {% for company in companies %}
+                <tr {% if company.name is highlighted(issuers) %}class="highlighted"{% endif %}>
+                    <td><a href="{{ company.link }}" target="_blank">{{ company.name }}</a></td>
+                    <td>{{ company.due_date }}</td>
+                    <td>{{ company.days_late }}</td>
+                </tr>
+                {% endfor %}
+            </tbody>
+        </table>
+    </div>
+
+    <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
+    <script src="https://cdn.datatables.net/1.13.4/js/jquery.dataTables.min.js"></script>
+    <script src="https://cdn.datatables.net/1.13.4/js/dataTables.bootstrap5.min.js"></script>
+    <script>
+        $(document).ready(function() {
+            $('#latePlcsTable').DataTable({
+                "order": [[ 2, "asc" ]],
+                "paging": false,
+                "searching": false,
+                "autoWidth": true,        
+                "columnDefs": [
+                    { 
+                        "targets": 0,  // Target the first column
+                        "width": "1%", // Let it auto-size but prevent it from taking too much space
+                        "render": function (data, type, full, meta) {
+                            return '<div style="white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">' + data + '</div>';
                         }
-                    ]
-                });
+                    }
+                ]
             });
-        </script>
-    </body>
-    </html>
-    """
+        });
+    </script>
+</body>
+</html>
+"""
+
+def normalise_name(name) -> str:
+    # Companies House and the LSE don't always agree on case and spacing. The LSE lists can also have numbers in
+    # the name column, which calamine gives us as floats
+    return str(name).strip().casefold()
+
+def is_highlighted(name: str, issuers: frozenset) -> bool:
+    return normalise_name(name) in issuers
+
+# Set up Jinja2 environment and compile the template once, rather than on every call to create_html.
+# The "highlighted" test has to be registered before the template is compiled
+JINJA_ENV = Environment(loader=FileSystemLoader(searchpath='.'))
+JINJA_ENV.tests['highlighted'] = is_highlighted
+HTML_TEMPLATE = JINJA_ENV.from_string(TEMPLATE_STRING)
+
+def create_html(late_plcs, issuers, html_export_file, number_of_active_plcs):
 
-    # Create a Jinja2 template from the string
-    template = env.from_string(template_string)
-    
     current_date = datetime.now().strftime('%-d %B %Y, %-I:%M%p').replace('AM', 'am').replace('PM', 'pm')
 
-    # Flatten the issuers list if it's nested (assuming the issuers are in a nested list)
-    flat_issuers = [item for sublist in issuers for item in sublist]
+    # Flatten the issuers list if it's nested (assuming the issuers are in a nested list).
+    # It's a set of normalised names, so that the "highlighted" test for each row of the table is a quick lookup
+    flat_issuers = frozenset(normalise_name(name) for sublist in issuers for name in sublist)
 
     # Render the template with the sorted list
-    html_output = template.render(companies=late_plcs, issuers=flat_issuers, current_date=current_date, number_of_late_plcs=len(late_plcs), number_of_active_plcs=number_of_active_plcs)
+    html_output = HTML_TEMPLATE.render(companies=late_plcs, issuers=flat_issuers, current_date=current_date, number_of_late_plcs=len(late_plcs), number_of_active_plcs=number_of_active_plcs)
 
     # Write the rendered HTML to the output file
     with open(html_export_file, 'w') as f:
@@ -334,10 +525,10 @@ if __name__ == "__main__":
     logzero.logfile(LOGFILE, maxBytes=1e6, backupCount=4)
     
     
-    listed_companies = []
-    for list, source in listed_sources.items():
-        logger.info(f"Downloading {list} issuers")
-        listed_companies.append(get_list_of_UK_issuers(source))    
+    # the lists are independent, so download and parse them at the same time
+    logger.info(f"Downloading {', '.join(listed_sources)} issuers")
+    with ThreadPoolExecutor(max_workers=len(listed_sources)) as executor:
+        listed_companies = list(executor.map(get_list_of_UK_issuers, listed_sources.values()))
 
     if GENERATE_PLC_LIST:
         logger.info("Reading list of all PLCs from Companies House")
@@ -354,6 +545,7 @@ if __name__ == "__main__":
         late_accounts, late_confirmations = get_late_plcs(active_plcs)
         save_to_file(late_accounts, LATE_ACCOUNTS_LIST_FILE)
         save_to_file(late_confirmations, LATE_CONFIRMATIONS_LIST_FILE)
+        clear_checkpoints()
     
     else:
         logger.info("Loading pregenerated list of all late accounts")